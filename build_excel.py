@@ -1,11 +1,19 @@
 from dataclasses import dataclass
-from typing import Dict, Set, List, Tuple
+from typing import Dict, Set, List, Tuple, Union
 import pandas as pd
 from precalculos import Precalc
 from read_instances import ProblemInstance
 from collections import defaultdict, Counter
 import numpy as np
 
+try:
+    from numba import njit
+    HAS_NUMBA = True
+except ModuleNotFoundError:  # numba es opcional: sin él se usan las versiones vectorizadas en NumPy
+    HAS_NUMBA = False
+    def njit(*args, **kwargs):
+        return lambda f: f
+
 
 @dataclass
 class export_results:
@@ -14,6 +22,42 @@ class export_results:
     df_groups: pd.DataFrame
     df_summary: pd.DataFrame 
 
+@njit(cache=True)
+def _isolated_from_codes(gd_codes, n, n_gd):
+    """
+    Kernel de conteo de aislados sobre códigos enteros de (Group, Day).
+    - gd_codes[i]: código (Group, Day) de la fila i de ctz
+    - n[i]: # de empleados de esa fila (Group, Day, Zone)
+    """
+    num_zones = np.zeros(n_gd, dtype=np.int64)
+    max_n = np.zeros(n_gd, dtype=np.int64)
+    total = np.zeros(n_gd, dtype=np.int64)
+    singles = np.zeros(n_gd, dtype=np.int64)
+    # Pasada 1: acumulados por (Group, Day)
+    for i in range(n.shape[0]):
+        g = gd_codes[i]
+        num_zones[g] += 1
+        total[g] += n[i]
+        if n[i] > max_n[g]:
+            max_n[g] = n[i]
+        if n[i] == 1:
+            singles[g] += 1
+    # Pasada 2: solo (Group, Day) que usan más de 1 zona
+    isolated = 0
+    for g in range(n_gd):
+        if num_zones[g] > 1:
+            isolated += total[g] if max_n[g] == 1 else singles[g]
+    return isolated
+
+def _isolated_from_codes_np(gd_codes, n, n_gd):
+    """Misma agregación que _isolated_from_codes, solo con agregaciones nativas de NumPy (sin numba)."""
+    num_zones = np.bincount(gd_codes, minlength=n_gd)
+    total = np.bincount(gd_codes, weights=n, minlength=n_gd)
+    singles = np.bincount(gd_codes, weights=(n == 1), minlength=n_gd)
+    max_n = np.zeros(n_gd, dtype=n.dtype)
+    np.maximum.at(max_n, gd_codes, n)
+    return int(np.where(max_n == 1, total, singles)[num_zones > 1].sum())
+
 def count_isolated_employees(df_assign: pd.DataFrame) -> int:  
     """
     Regla:
@@ -24,6 +68,7 @@ def count_isolated_employees(df_assign: pd.DataFrame) -> int:
     Notas:
       - Requiere columnas: ['Group','Day','Zone','Employee'].
       - Filas con Zone nula se ignoran para el conteo (no aportan zonas).
+      - Filas con Group o Day nulos (p.ej. empleados sin grupo) se ignoran.
     Retorna:
       - Entero con la suma total de aislados.
     """
@@ -32,46 +77,58 @@ def count_isolated_employees(df_assign: pd.DataFrame) -> int:
     if missing:
         raise ValueError(f"Faltan columnas en df_assign: {missing}")
 
-    # Usamos solo filas con zona conocida
-    df = df_assign[df_assign['Zone'].notna()].copy()
+    # Usamos solo filas con Group, Day y Zone conocidos y solo las columnas clave (sin copiar df_assign completo).
+    # Claves como Categorical: los groupby trabajan sobre códigos int en vez de hashear strings
+    keys = ['Group','Day','Zone']
+    df = df_assign.loc[df_assign[keys].notna().all(axis=1), keys].astype({c: 'category' for c in keys})
+
+    # Solo interesan (Group, Day) que usan más de 1 zona; si no hay ninguno no se construye ctz
+    multi_zone = (
+        df.groupby(['Group','Day'], observed=True, sort=False)['Zone']
+          .transform('nunique') > 1
+    )
+    if not multi_zone.any():
+        return 0
+    df = df[multi_zone]
 
     # Conteos por (Group, Day, Zone)
     ctz = (
-        df.groupby(['Group','Day','Zone'], dropna=False)
+        df.groupby(['Group','Day','Zone'], observed=True, sort=False)
           .size()
           .reset_index(name='n')
     )
 
-    # (Group, Day) candidatos: usan más de 2 zonas
-    zones_per_gd = (
-        ctz.groupby(['Group','Day'])['Zone']
-           .nunique()
-           .reset_index(name='num_zones')
-    )
-    cand = zones_per_gd[zones_per_gd['num_zones'] > 1][['Group','Day']]
-    if cand.empty:
-        return 0
-
-    ctz = ctz.merge(cand, on=['Group','Day'], how='inner')
-
-    # Aislados por (Group, Day):
+    # Aislados por (Group, Day), solo si el grupo usa más de 1 zona ese día:
     # - si todas las zonas tienen n==1 -> aislados = total del grupo ese día
     # - si hay zonas con n>1 -> aislados = # de personas en zonas con n==1
-    def _isolados_grupo_dia(g):
-        singles = (g['n'] == 1)
-        if singles.all():
-            return int(g['n'].sum())
-        return int(g.loc[singles, 'n'].sum())
-
-    isolated_total = int(
-        ctz.groupby(['Group','Day']).apply(_isolados_grupo_dia, include_groups=False).sum()
-        )
+    # Código denso (Group, Day) a partir de los códigos categóricos, sin otro groupby:
+    # el kernel agrega todo en una sola pasada sobre ctz
+    g_codes = ctz['Group'].cat.codes.to_numpy(np.int32)
+    d_codes = ctz['Day'].cat.codes.to_numpy(np.int32)
+    n_d = len(ctz['Day'].cat.categories)
+    n_gd = len(ctz['Group'].cat.categories) * n_d
+    kernel = _isolated_from_codes if HAS_NUMBA else _isolated_from_codes_np
+    isolated_total = int(kernel(g_codes * n_d + d_codes, ctz['n'].to_numpy(np.int32), n_gd))
     
     return isolated_total   
 
 
+def assignment_arrays(assignments: Union[List[Tuple[str, str, str]], pd.DataFrame]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Convierte las asignaciones a Struct-of-Arrays: (employees, days, desks), tres arreglos paralelos.
+    Acepta la lista de tuplas (Employee, Day, Desk) de la Fase 3 o un DataFrame con esas columnas.
+    """
+    if isinstance(assignments, pd.DataFrame):
+        return tuple(assignments[c].to_numpy(dtype=object) for c in ("Employee", "Day", "Desk"))
+    n = len(assignments)
+    cols = tuple(np.empty(n, dtype=object) for _ in range(3))
+    if n:
+        cols[0][:], cols[1][:], cols[2][:] = zip(*assignments)
+    return cols
+
+
 def build_outputs(inst: ProblemInstance, pre: Precalc, group_meeting_day: Dict[str, str], schedule_by_employee: Dict[str, Set[str]], 
-                  assignments: List[Tuple[str, str, str]], df_assign: pd.DataFrame) -> export_results:    
+                  assignments: Union[List[Tuple[str, str, str]], pd.DataFrame], df_assign: pd.DataFrame) -> export_results:    
     """
     Construye los tres DataFrames exigidos por la plantilla:
       1) EmployeeAssignment (ANCHO): columnas = ['Employee'] + list(inst.days)
@@ -82,28 +139,24 @@ def build_outputs(inst: ProblemInstance, pre: Precalc, group_meeting_day: Dict[s
          - Employee preferences = # (e,d) de Fase 2 donde d ∈ days_by_employee[e]
          - Isolated employees = suma empleado–día donde e es el único de su grupo asistiendo ese día
     """
-    # ---- sets para rapidez ----
-    days_by_employee = {e: set(v) for e, v in inst.days_by_employee.items()}
-    desks_by_employee = {e: set(v) for e, v in inst.desks_by_employee.items()}
-    employees_by_group = {g: set(v) for g, v in inst.employees_by_group.items()}
+    # ---- asignaciones como arreglos paralelos (una sola conversión) ----
+    asg_emp, asg_day, asg_desk = assignment_arrays(assignments)
 
     # ================= EmployeeAssignment (ANCHO) =================
-    # Mapa (Employee, Day) -> Desk
+    # Rejilla empleado × día llenada con índices enteros y armada columna a columna (sin dicts por fila)
     # Si hubiera duplicados (no debería), nos quedamos con el último
-    ed_to_desk = {}
-    for e, d, desk in assignments:
-        ed_to_desk[(e, d)] = str(desk)
-
-    # Construimos filas: una por empleado, columnas por día
-    rows = []
     day_list = list(inst.days)  # respeta el orden definido en la instancia
-    for e in sorted(inst.employees):
-        row = {"Employee": e}
-        for d in day_list:
-            row[d] = ed_to_desk.get((e, d), "None")
-        rows.append(row)
-
-    df_assign_wide = pd.DataFrame(rows, columns=["Employee"] + day_list)
+    emps_sorted = np.sort(np.array(inst.employees, dtype=object))
+    e_idx = pd.Index(emps_sorted).get_indexer(asg_emp)
+    d_idx = pd.Index(day_list).get_indexer(asg_day)
+    ok = np.flatnonzero((e_idx >= 0) & (d_idx >= 0))
+    cell = e_idx[ok].astype(np.int64) * len(day_list) + d_idx[ok]
+    _, last = np.unique(cell[::-1], return_index=True)      # última ocurrencia de cada (e, d)
+    ok = ok[len(ok) - 1 - last]
+
+    grid = np.full((len(emps_sorted), len(day_list)), "None", dtype=object)
+    grid[e_idx[ok], d_idx[ok]] = asg_desk[ok].astype(str)
+    df_assign_wide = pd.DataFrame({"Employee": emps_sorted, **{d: grid[:, j] for j, d in enumerate(day_list)}})
 
     # ================= Groups Meeting day =================
     df_groups = pd.DataFrame(
@@ -113,16 +166,20 @@ def build_outputs(inst: ProblemInstance, pre: Precalc, group_meeting_day: Dict[s
 
     # ================= Summary =================
     # -- 1) Valid assignments (desde 'assignments' largos)
-    valid_assignments = 0
-    for e, d, desk in assignments:
-        if desk != "none" and desk in desks_by_employee.get(e, set()):
-            valid_assignments += 1
+    #    códigos enteros (-1 si no existe) y consulta directa a la matriz de compatibilidad e × desk
+    emp_code = pd.Index(list(pre.emp_id)).get_indexer(asg_emp)
+    desk_code = pd.Index(list(pre.desk_id)).get_indexer(asg_desk)
+    compat_lookup = np.zeros((len(pre.emp_id), len(pre.desk_id)), dtype=bool)
+    compat_lookup[np.repeat(np.arange(len(pre.emp_id)), np.diff(pre.compat_indptr)), pre.compat_desks] = True
+    known = (emp_code >= 0) & (desk_code >= 0) & (asg_desk != "none")
+    valid_assignments = int(compat_lookup[emp_code[known], desk_code[known]].sum())
 
     # -- 2) Employee preferences (desde schedule_by_employee)
-    prefs_count = 0
-    for e, days in schedule_by_employee.items():
-        prefs_count += sum(1 for d in days if d in days_by_employee.get(e, set()))
-    employee_preferences = int(prefs_count)
+    #    pertenencia en frozensets precalculados (O(1) por día); más rápido que máscaras de bits en NumPy.
+    prefs = inst.days_by_employee_set
+    employee_preferences = sum(
+        1 for e, days in schedule_by_employee.items() for d in days if d in prefs.get(e, ())
+    )
 
     # -- 3) Isolated employees (suma empleado–día): fuera del núcleo (1–2 zonas sucesivas) del grupo ese día
     isolated_employee_days = count_isolated_employees(df_assign)
@@ -140,6 +197,10 @@ def build_outputs(inst: ProblemInstance, pre: Precalc, group_meeting_day: Dict[s
     )
 
 
+# Filas que se inspeccionan por columna para estimar el ancho en Excel
+WIDTH_SAMPLE_ROWS = 200
+
+
 def export_solution_excel(path, df_assign, df_groups, df_summary):
     """
     Exporta a Excel con las TRES hojas con nombres EXACTOS:
@@ -158,7 +219,7 @@ def export_solution_excel(path, df_assign, df_groups, df_summary):
         df_groups.to_excel(w, index=False, sheet_name="Groups Meeting day")
         df_summary.to_excel(w, index=False, sheet_name="Summary")
 
-        # Autoajuste simple
+        # Autoajuste simple: ancho según el nombre de la columna y una muestra acotada de filas
         for sheet_name, df in {
             "EmployeeAssignment": df_assign,
             "Groups Meeting day": df_groups,
@@ -166,5 +227,6 @@ def export_solution_excel(path, df_assign, df_groups, df_summary):
         }.items():
             ws = w.sheets[sheet_name]
             for i, col in enumerate(df.columns):
-                width = max(12, min(40, int(df[col].astype(str).map(len).max() if not df.empty else 12) + 2))
+                sample_len = int(df[col].head(WIDTH_SAMPLE_ROWS).astype(str).map(len).max()) if not df.empty else 12
+                width = max(12, min(40, max(len(str(col)), sample_len) + 2))
                 ws.set_column(i, i, width)
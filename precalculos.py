@@ -1,24 +1,76 @@
 # precalculos.py
 from dataclasses import dataclass, fields
+from functools import cached_property
 from typing import Dict, Set, List
-from read_instances import ProblemInstance
+import numpy as np
+from read_instances import ProblemInstance, cache_load, cache_store, instance_content_key
+
+try:
+    from numba import njit, prange
+    HAS_NUMBA = True
+except ModuleNotFoundError:  # numba es opcional: sin él se usa la versión vectorizada en NumPy
+    HAS_NUMBA = False
+    prange = range
+    def njit(*args, **kwargs):
+        return lambda f: f
 
 @dataclass
 class Precalc: # Tipos de datos
+    # IDs enteros densos (índice en las listas de la instancia)
+    emp_id: Dict[str, int]                       # e -> i
+    desk_id: Dict[str, int]                      # d -> i
+    day_id: Dict[str, int]                       # día -> i
+    group_id: Dict[str, int]                     # g -> i
+    zone_id: Dict[str, int]                      # Z -> i
     # Básicos
     cap_zone: Dict[str, int]                     # Z -> #desks
-    compat: Dict[str, Set[str]]                  # e -> {desks compatibles}
-    avail: Dict[str, Set[str]]                   # e -> {días disponibles}
+    compat_indptr: np.ndarray                    # int32[n_emp+1]: CSR, desks de e en compat_desks[indptr[e]:indptr[e+1]]
+    compat_desks: np.ndarray                     # int32[nnz]: IDs de desks compatibles
+    avail_indptr: np.ndarray                     # int32[n_emp+1]: CSR, días de e en avail_days[indptr[e]:indptr[e+1]]
+    avail_days: np.ndarray                       # int32[nnz]: IDs de días disponibles
     group_of_emp: Dict[str, str]                 # e -> g
     employees_of_group: Dict[str, List[str]]     # g -> [e,...]
     zone_of_desk: Dict[str, str]                 # d -> z
     # Derivados útiles
     group_size: Dict[str, int]                   # g -> #empleados
-    avail_gd: Dict[str, Dict[str, int]]          # g -> {día -> #miembros disponibles}
+    avail_gd_mat: np.ndarray                     # int32[n_groups, n_days]: #miembros disponibles
     common_days_group: Dict[str, List[str]]      # g -> {días en los que todo el grupo está disponible}
-    compat_in_zone: Dict[str, Dict[str, int]]    # e -> {zona -> #desks compatibles en esa zona}
-    compat_union_gz: Dict[str, Dict[str, int]]   # g -> {zona -> #desks distintos compatibles para el grupo}
+    compat_in_zone_mat: np.ndarray               # int32[n_emp, n_zones]: #desks compatibles en esa zona
+    compat_union_gz_mat: np.ndarray              # int32[n_groups, n_zones]: #desks distintos compatibles para el grupo
+    compat_bits: np.ndarray                      # uint64[n_emp, W]: bit (w*64+j) <-> desk compatible, W = ceil(n_desks/64)
+    zone_bits: np.ndarray                        # uint64[n_zones, W]: bit (w*64+j) <-> desk en la zona
     load_day: Dict[str, int]                     # día -> carga inicial (0)
+
+    # Vistas por nombre (compatibilidad con el código que indexa por strings)
+    @cached_property
+    def compat(self) -> Dict[str, Set[str]]:     # e -> {desks compatibles}
+        desks = list(self.desk_id)
+        p, idx = self.compat_indptr, self.compat_desks
+        return {e: {desks[j] for j in idx[p[i]:p[i + 1]]} for e, i in self.emp_id.items()}
+
+    @cached_property
+    def avail(self) -> Dict[str, Set[str]]:      # e -> {días disponibles}
+        days = list(self.day_id)
+        p, idx = self.avail_indptr, self.avail_days
+        return {e: {days[j] for j in idx[p[i]:p[i + 1]]} for e, i in self.emp_id.items()}
+
+    @cached_property
+    def avail_gd(self) -> Dict[str, Dict[str, int]]:          # g -> {día -> #miembros disponibles}
+        days = list(self.day_id)
+        return {g: dict(zip(days, self.avail_gd_mat[i].tolist())) for g, i in self.group_id.items()}
+
+    @cached_property
+    def compat_in_zone(self) -> Dict[str, Dict[str, int]]:    # e -> {zona -> #desks compatibles en esa zona}
+        zones = list(self.zone_id)
+        return {e: dict(zip(zones, self.compat_in_zone_mat[i].tolist())) for e, i in self.emp_id.items()}
+
+    @cached_property
+    def compat_union_gz(self) -> Dict[str, Dict[str, int]]:   # g -> {zona -> #desks distintos compatibles para el grupo}
+        zones = list(self.zone_id)
+        return {
+            g: dict(zip(zones, self.compat_union_gz_mat[i].tolist())) if g in self.employees_of_group else {}
+            for g, i in self.group_id.items()
+        }
     
     # Print Attributes
     def attribute_names(self, with_types: bool = False) -> list[str]:
@@ -40,63 +92,152 @@ class Precalc: # Tipos de datos
         for i, name in enumerate(self.attribute_names(with_types), 1):
             print(f"{i}. {name}")
 
-def compute_precalcs(inst: ProblemInstance) -> Precalc: # Calculo de los datos
+def _csr(rows: List[str], items: Dict[str, Set[str]], col_id: Dict[str, int]):
+    """Codifica {fila -> {columnas}} como par (indptr, indices) int32 en el orden de `rows`."""
+    indptr = np.zeros(len(rows) + 1, dtype=np.int32)
+    chunks = []
+    for i, r in enumerate(rows):
+        cols = sorted(col_id[c] for c in items.get(r, set()) if c in col_id)
+        chunks.append(cols)
+        indptr[i + 1] = indptr[i] + len(cols)
+    indices = np.fromiter((c for cols in chunks for c in cols), dtype=np.int32, count=int(indptr[-1]))
+    return indptr, indices
+
+def _desk_bits(rows: np.ndarray, desks: np.ndarray, n_rows: int, n_desks: int) -> np.ndarray:
+    """Máscara de bits uint64[n_rows, ceil(n_desks/64)] con el bit de cada par (fila, desk) encendido."""
+    bits = np.zeros((n_rows, (n_desks + 63) // 64), dtype=np.uint64)
+    desks = np.asarray(desks, dtype=np.uint64)
+    np.bitwise_or.at(bits, (np.asarray(rows, dtype=np.intp), (desks // 64).astype(np.intp)),
+                     np.left_shift(np.uint64(1), desks % np.uint64(64)))
+    return bits
+
+def _popcount(bits: np.ndarray) -> np.ndarray:
+    """# de bits encendidos por fila de una matriz uint64."""
+    return np.unpackbits(np.ascontiguousarray(bits).view(np.uint8), axis=-1).sum(axis=-1, dtype=np.int32)
+
+@njit(parallel=True, cache=True)
+def _union_coverage(member_ptr, members, emp_bits, zone_bits):
+    """g × zona: popcount(OR de las máscaras de los miembros de g AND máscara de la zona), en paralelo por grupo."""
+    n_groups = member_ptr.shape[0] - 1
+    n_zones, W = zone_bits.shape
+    out = np.zeros((n_groups, n_zones), dtype=np.int32)
+    for g in prange(n_groups):
+        g_bits = np.zeros(W, dtype=np.uint64)
+        for k in range(member_ptr[g], member_ptr[g + 1]):
+            for w in range(W):
+                g_bits[w] |= emp_bits[members[k], w]
+        for z in range(n_zones):
+            c = 0
+            for w in range(W):
+                x = g_bits[w] & zone_bits[z, w]
+                while x:
+                    x &= x - np.uint64(1)
+                    c += 1
+            out[g, z] = c
+    return out
+
+def _union_coverage_np(member_ptr, members, emp_bits, zone_bits):
+    """Misma cobertura que _union_coverage, con operaciones vectorizadas de NumPy (sin numba)."""
+    out = np.zeros((member_ptr.shape[0] - 1, zone_bits.shape[0]), dtype=np.int32)
+    for g in range(out.shape[0]):
+        g_bits = np.bitwise_or.reduce(emp_bits[members[member_ptr[g]:member_ptr[g + 1]]], axis=0)
+        out[g] = _popcount(g_bits & zone_bits)
+    return out
+
+def compute_precalcs(inst: ProblemInstance, *, use_cache: bool = False) -> Precalc: # Calculo de los datos
+    """
+    Calcula el Precalc de la instancia.
+    Con use_cache=True (opt-in) se reutiliza el Precalc guardado en disco (CACHE_DIR) para el
+    contenido ACTUAL de la instancia (hash de sus campos), así que editarla en memoria invalida la caché.
+    """
+    # ---- Caché en disco por contenido actual de la instancia
+    key = instance_content_key(inst) if use_cache else None
+    if key is not None:
+        cached = cache_load(key)
+        if cached is not None:
+            return cached
+
+    # ---- IDs enteros densos
+    emp_id   = {e: i for i, e in enumerate(inst.employees)}
+    desk_id  = {d: i for i, d in enumerate(inst.desks)}
+    day_id   = {d: i for i, d in enumerate(inst.days)}
+    group_id = {g: i for i, g in enumerate(inst.groups)}
+    zone_id  = {z: i for i, z in enumerate(inst.zones)}
+
     # ---- Básicos
     cap_zone = {z: len(ds) for z, ds in inst.desks_by_zone.items()}
     compat   = {e: set(ds) for e, ds in inst.desks_by_employee.items()}
     avail    = {e: set(ds) for e, ds in inst.days_by_employee.items()}
+    compat_indptr, compat_desks = _csr(inst.employees, compat, desk_id)
+    avail_indptr, avail_days = _csr(inst.employees, avail, day_id)
     group_of_emp = dict(inst.group_of_employee)          # ya lo construye el loader
     employees_of_group = {g: list(es) for g, es in inst.employees_by_group.items()}
     zone_of_desk = dict(inst.zone_of_desk)               # ya lo construye el loader
 
-    # Conjuntos por zona para intersecciones rápidas
-    desks_in_zone = {z: set(ds) for z, ds in inst.desks_by_zone.items()}
-    
     # tamaño del grupo
     group_size = {g: len(es) for g, es in employees_of_group.items()}
 
-    # ---- g × día: cuántos del grupo pueden asistir ese día
-    avail_gd: Dict[str, Dict[str, int]] = {g: {d: 0 for d in inst.days} for g in inst.groups}
-    for g, es in employees_of_group.items():
-        for e in es:
-            for d in avail.get(e, set()):
-                avail_gd[g][d] += 1
-                
+    # ---- g × día: cuántos del grupo pueden asistir ese día (un solo scatter sobre pares (e, día))
+    emp_group = np.array([group_id.get(group_of_emp.get(e), -1) for e in inst.employees], dtype=np.int32)
+    g_of_row = emp_group[np.repeat(np.arange(len(inst.employees)), np.diff(avail_indptr))]
+    in_group = g_of_row >= 0
+    avail_gd_mat = np.zeros((len(inst.groups), len(inst.days)), dtype=np.int32)
+    np.add.at(avail_gd_mat, (g_of_row[in_group], avail_days[in_group]), 1)
+
     # ---- g × día: días en los que todo el grupo está disponible
     common_days_group: Dict[str, List[str]] = {g: [] for g in inst.groups}
     for g in employees_of_group:
-        for d in inst.days:
-            if avail_gd.get(g, {}).get(d, 0) == group_size[g]:
-                common_days_group[g].append(d)
-                    
+        full = np.nonzero(avail_gd_mat[group_id[g]] == group_size[g])[0]
+        common_days_group[g] = [inst.days[i] for i in full]
+
+    # ---- Matrices de incidencia para reemplazar intersecciones de sets
+    compat_rows = np.repeat(np.arange(len(inst.employees)), np.diff(compat_indptr))
+    E_by_D = np.zeros((len(inst.employees), len(inst.desks)), dtype=np.uint8)  # e × desk compatible
+    E_by_D[compat_rows, compat_desks] = 1
+    Z_by_D = np.zeros((len(inst.zones), len(inst.desks)), dtype=np.uint8)      # zona × desk
+    for z, ds in inst.desks_by_zone.items():
+        Z_by_D[zone_id[z], [desk_id[d] for d in ds if d in desk_id]] = 1
+
+    # ---- Máscaras de bits por desk (una fila de W palabras uint64 por empleado / zona)
+    compat_bits = _desk_bits(compat_rows, compat_desks, len(inst.employees), len(inst.desks))
+    zone_rows, zone_desks = np.nonzero(Z_by_D)
+    zone_bits = _desk_bits(zone_rows, zone_desks, len(inst.zones), len(inst.desks))
 
     # ---- e × zona: cuántos escritorios compatibles tiene el empleado en cada zona
-    compat_in_zone: Dict[str, Dict[str, int]] = {e: {} for e in inst.employees} 
-    for e in inst.employees: 
-        for z in inst.zones: 
-            compat_in_zone[e][z] = len(compat.get(e, set()) & desks_in_zone.get(z, set()))
-
-    # ---- g × zona: escritorios DISTINTOS que cubre el grupo (unión de compatibilidades del grupo)
-    compat_union_gz: Dict[str, Dict[str, int]] = {g: {} for g in inst.groups}
-    for g, es in employees_of_group.items():
-        union_compat = set().union(*(compat.get(e, set()) for e in es))
-        for z in inst.zones:
-            compat_union_gz[g][z] = len(union_compat & desks_in_zone[z])
+    #      producto en float32 para usar BLAS (conteos exactos mientras sean < 2**24)
+    compat_in_zone_mat = (E_by_D.astype(np.float32) @ Z_by_D.T.astype(np.float32)).astype(np.int32)
+
+    # ---- g × zona: escritorios DISTINTOS que cubre el grupo (OR de las máscaras del grupo, AND por zona)
+    member_ptr, members = _csr(inst.groups, {g: set(es) for g, es in employees_of_group.items()}, emp_id)
+    union_coverage = _union_coverage if HAS_NUMBA else _union_coverage_np
+    compat_union_gz_mat = union_coverage(member_ptr, members, compat_bits, zone_bits)
 
     # ---- carga inicial por día (se irá actualizando en Fase 2)
     load_day = {d: 0 for d in inst.days}
 
-    return Precalc(
+    pre = Precalc(
+        emp_id=emp_id,
+        desk_id=desk_id,
+        day_id=day_id,
+        group_id=group_id,
+        zone_id=zone_id,
         cap_zone=cap_zone,
-        compat=compat,
-        avail=avail,
+        compat_indptr=compat_indptr,
+        compat_desks=compat_desks,
+        avail_indptr=avail_indptr,
+        avail_days=avail_days,
         group_of_emp=group_of_emp,
         employees_of_group=employees_of_group,
         zone_of_desk=zone_of_desk,
         group_size=group_size,
-        avail_gd=avail_gd,
+        avail_gd_mat=avail_gd_mat,
         common_days_group=common_days_group,
-        compat_in_zone=compat_in_zone,
-        compat_union_gz=compat_union_gz,
+        compat_in_zone_mat=compat_in_zone_mat,
+        compat_union_gz_mat=compat_union_gz_mat,
+        compat_bits=compat_bits,
+        zone_bits=zone_bits,
         load_day=load_day,
-    )
\ No newline at end of file
+    )
+    if key is not None:
+        cache_store(key, pre)
+    return pre
\ No newline at end of file
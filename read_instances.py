@@ -3,9 +3,14 @@
 from __future__ import annotations
 
 from dataclasses import dataclass, field, fields
+from functools import cached_property
 from pathlib import Path
-from typing import Dict, List, Set, Tuple, Union, IO, Optional
+from typing import Any, Dict, List, Set, Tuple, Union, IO, Optional
+import hashlib
 import json
+import os
+import pickle
+import tempfile
 import pandas as pd  # type: ignore
 
 # ------------------------------
@@ -51,6 +56,12 @@ class ProblemInstance:
             }
         return self._summary
     
+    # Set views (materialized once, for fast membership tests)
+    @cached_property
+    def days_by_employee_set(self) -> Dict[str, frozenset]:
+        """days_by_employee as e -> frozenset of days (snapshot taken at first access)."""
+        return {e: frozenset(v) for e, v in self.days_by_employee.items()}
+
     # Print Attributes
     def attribute_names(self, include_private: bool = False, with_types: bool = False) -> list[str]:
         """
@@ -101,8 +112,59 @@ def _read_json(source: Union[str, Path, IO[str], dict]) -> dict:
         return json.load(f)
 
 
-def _unique(seq: List[str]) -> bool:
-    return len(seq) == len(set(seq))
+def _check_list_str_unique(key: str, value: object) -> Tuple[Set[str], List[str]]:
+    """
+    Single pass over a declared list: type check and uniqueness at once.
+    Returns the set of its str values (for the cross-reference checks) and the errors found.
+    """
+    if not isinstance(value, list):
+        return set(), [f"Key '{key}' must be a list[str]."]
+    seen: Set[str] = set()
+    bad_type = duplicated = False
+    for x in value:
+        if not isinstance(x, str):
+            bad_type = True
+        elif x in seen:
+            duplicated = True
+        else:
+            seen.add(x)
+    errors: List[str] = []
+    if bad_type:
+        errors.append(f"Key '{key}' must be a list[str].")
+    if duplicated:
+        errors.append(f"Values under '{key}' must be unique.")
+    return seen, errors
+
+
+def _check_mapping(key: str, value: object,
+                   owners: Set[str], owner_label: Tuple[str, str],
+                   items: Set[str], item_label: Tuple[str, str],
+                   exclusive_msg: Optional[str] = None) -> Tuple[List[str], List[str]]:
+    """
+    Single pass over a str -> list[str] mapping: type checks and cross-references at once.
+    - owner_label / item_label: (singular name, declaring key), e.g. ("Zone", "Zones")
+    - exclusive_msg: if given, error template for an item that appears under several owners
+    Returns (type_errors, reference_errors).
+    """
+    if not isinstance(value, dict):
+        return [f"Key '{key}' must be a dict."], []
+    ref_errors: List[str] = []
+    seen: Set[str] = set()
+    for k, v in value.items():
+        if not isinstance(k, str) or not isinstance(v, list):
+            return [f"Key '{key}' must map str -> list[str]."], ref_errors
+        if k not in owners:
+            ref_errors.append(f"{owner_label[0]} '{k}' in {key} not declared in {owner_label[1]}.")
+        for x in v:
+            if not isinstance(x, str):
+                return [f"Key '{key}' must map str -> list[str]."], ref_errors
+            if x not in items:
+                ref_errors.append(f"{item_label[0]} '{x}' in {key}[{k}] not declared in {item_label[1]}.")
+            if exclusive_msg is not None:
+                if x in seen:
+                    ref_errors.append(exclusive_msg.format(x))
+                seen.add(x)
+    return [], ref_errors
 
 
 def validate_instance_dict(data: dict) -> List[str]:
@@ -117,82 +179,41 @@ def validate_instance_dict(data: dict) -> List[str]:
     if errors:
         return errors
 
-    # Basic types
-    def _expect_list_of_str(key: str):
-        if not isinstance(data[key], list) or not all(isinstance(x, str) for x in data[key]):
-            errors.append(f"Key '{key}' must be a list[str].")
-
-    for key in ["Employees", "Desks", "Days", "Groups", "Zones"]:
-        _expect_list_of_str(key)
-
-    # Uniqueness
+    # Declared lists: types + uniqueness in one pass; the resulting sets feed the cross-references
+    declared: Dict[str, Set[str]] = {}
     for key in ["Employees", "Desks", "Days", "Groups", "Zones"]:
-        if not _unique(data[key]):
-            errors.append(f"Values under '{key}' must be unique.")
-
-    # Dicts
-    def _expect_dict_of_list_str(key: str):
-        if not isinstance(data[key], dict):
-            errors.append(f"Key '{key}' must be a dict.")
-            return
-        for k, v in data[key].items():
-            if not isinstance(k, str) or not isinstance(v, list) or not all(isinstance(x, str) for x in v):
-                errors.append(f"Key '{key}' must map str -> list[str].")
-                break
-
-    for key in ["Desks_Z", "Desks_E", "Employees_G", "Days_E"]:
-        _expect_dict_of_list_str(key)
+        declared[key], key_errors = _check_list_str_unique(key, data[key])
+        errors.extend(key_errors)
+
+    employees = declared["Employees"]
+    desks = declared["Desks"]
+    days = declared["Days"]
+    groups = declared["Groups"]
+    zones = declared["Zones"]
+
+    # Mappings: types + cross-references in one pass.
+    # Reference errors are only reported when every type/uniqueness check passed.
+    ref_errors: List[str] = []
+    for key, owners, owner_label, items, item_label, exclusive_msg in [
+        # Desks_Z: zones exist; desks exist; each desk appears in at most one zone
+        ("Desks_Z", zones, ("Zone", "Zones"), desks, ("Desk", "Desks"), "Desk '{}' appears in multiple zones."),
+        # Desks_E: employees exist; desks exist
+        ("Desks_E", employees, ("Employee", "Employees"), desks, ("Desk", "Desks"), None),
+        # Employees_G: groups exist; employees exist; employees unique across groups
+        ("Employees_G", groups, ("Group", "Groups"), employees, ("Employee", "Employees"),
+         "Employee '{}' appears in multiple groups."),
+        # Days_E: employees exist; days exist
+        ("Days_E", employees, ("Employee", "Employees"), days, ("Day", "Days"), None),
+    ]:
+        type_errors, key_ref_errors = _check_mapping(
+            key, data[key], owners, owner_label, items, item_label, exclusive_msg
+        )
+        errors.extend(type_errors)
+        ref_errors.extend(key_ref_errors)
 
     if errors:
         return errors
-
-    employees: Set[str] = set(data["Employees"])
-    desks: Set[str] = set(data["Desks"])
-    days: Set[str] = set(data["Days"])
-    groups: Set[str] = set(data["Groups"])
-    zones: Set[str] = set(data["Zones"])
-
-    # Desks_Z: zones exist; desks exist; each desk appears in at most one zone
-    seen_desks: Set[str] = set()
-    for z, ds in data["Desks_Z"].items():
-        if z not in zones:
-            errors.append(f"Zone '{z}' in Desks_Z not declared in Zones.")
-        for d in ds:
-            if d not in desks:
-                errors.append(f"Desk '{d}' in Desks_Z[{z}] not declared in Desks.")
-            if d in seen_desks:
-                errors.append(f"Desk '{d}' appears in multiple zones.")
-            seen_desks.add(d)
-
-    # Desks_E: employees exist; desks exist
-    for e, ds in data["Desks_E"].items():
-        if e not in employees:
-            errors.append(f"Employee '{e}' in Desks_E not declared in Employees.")
-        for d in ds:
-            if d not in desks:
-                errors.append(f"Desk '{d}' in Desks_E[{e}] not declared in Desks.")
-
-    # Employees_G: groups exist; employees exist; employees unique across groups
-    seen_emp_in_groups: Set[str] = set()
-    for g, es in data["Employees_G"].items():
-        if g not in groups:
-            errors.append(f"Group '{g}' in Employees_G not declared in Groups.")
-        for e in es:
-            if e not in employees:
-                errors.append(f"Employee '{e}' in Employees_G[{g}] not declared in Employees.")
-            if e in seen_emp_in_groups:
-                errors.append(f"Employee '{e}' appears in multiple groups.")
-            seen_emp_in_groups.add(e)
-
-    # Days_E: employees exist; days exist
-    for e, ds in data["Days_E"].items():
-        if e not in employees:
-            errors.append(f"Employee '{e}' in Days_E not declared in Employees.")
-        for d in ds:
-            if d not in days:
-                errors.append(f"Day '{d}' in Days_E[{e}] not declared in Days.")
-
-    return errors
+    return ref_errors
 
 
 def build_reverse_indices(inst: ProblemInstance) -> None:
@@ -212,6 +233,94 @@ def build_reverse_indices(inst: ProblemInstance) -> None:
     inst.group_of_employee = group_of_employee
 
 
+# ------------------------------
+# On-disk cache
+# ------------------------------
+
+CACHE_DIR = Path.home() / ".cache" / "heur"
+# Bump whenever Precalc changes layout so stale pickles are ignored
+CACHE_VERSION = 2
+# Least recently used entries beyond this many files are evicted on store
+CACHE_MAX_ENTRIES = 32
+
+
+def instance_cache_key(data: dict) -> Optional[str]:
+    """Content hash of an instance dict, or None if it is not JSON-serializable."""
+    try:
+        payload = json.dumps(data, sort_keys=True)
+    except (TypeError, ValueError):
+        return None
+    return hashlib.blake2b(payload.encode("utf-8")).hexdigest()
+
+
+def instance_content_key(inst: ProblemInstance) -> Optional[str]:
+    """
+    Content hash of an instance as it is now (source fields plus reverse indices),
+    so in-memory edits made after load_instance produce a different key.
+    """
+    return instance_cache_key({
+        "Employees": inst.employees,
+        "Desks": inst.desks,
+        "Days": inst.days,
+        "Groups": inst.groups,
+        "Zones": inst.zones,
+        "Desks_Z": inst.desks_by_zone,
+        "Desks_E": inst.desks_by_employee,
+        "Employees_G": inst.employees_by_group,
+        "Days_E": inst.days_by_employee,
+        "zone_of_desk": inst.zone_of_desk,
+        "group_of_employee": inst.group_of_employee,
+    })
+
+
+def cache_load(key: str) -> Optional[Any]:
+    """Return the object cached under `key`, or None on miss, stale version or unreadable file."""
+    path = CACHE_DIR / f"{key}.pkl"
+    try:
+        with path.open("rb") as f:
+            entry = pickle.load(f)
+    except Exception:  # missing, truncated or incompatible pickle: treat as a miss
+        return None
+    if not isinstance(entry, dict) or entry.get("version") != CACHE_VERSION:
+        return None
+    try:
+        os.utime(path)  # a hit counts as recent use for eviction
+    except OSError:
+        pass
+    return entry.get("value")
+
+
+def cache_store(key: str, value: Any) -> None:
+    """
+    Write `value` under `key` and evict the least recently used entries.
+    Writes go through a unique temp file, so concurrent runs never share a partial file.
+    Failures are ignored: the cache is best-effort.
+    """
+    tmp_name: Optional[str] = None
+    try:
+        CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        with tempfile.NamedTemporaryFile(dir=CACHE_DIR, suffix=".tmp", delete=False) as f:
+            tmp_name = f.name
+            pickle.dump({"version": CACHE_VERSION, "value": value}, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_name, CACHE_DIR / f"{key}.pkl")
+        tmp_name = None
+        _cache_evict()
+    except Exception:
+        pass
+    finally:
+        if tmp_name is not None:
+            try:
+                os.unlink(tmp_name)
+            except OSError:
+                pass
+
+
+def _cache_evict() -> None:
+    entries = sorted(CACHE_DIR.glob("*.pkl"), key=lambda p: p.stat().st_mtime, reverse=True)
+    for p in entries[CACHE_MAX_ENTRIES:]:
+        p.unlink(missing_ok=True)
+
+
 def load_instance(source: Union[str, Path, IO[str], dict], *, strict: bool = True) -> ProblemInstance:
     """
     Load a problem instance from a path, file-like, or dict.